@@ -384,6 +384,70 @@ class DocumentClassifier:
         else:
             return []
 
+    def predict_batch(
+        self,
+        contents,
+        correspondents=True,
+        document_types=True,
+        tags=True,
+        storage_paths=True,
+    ):
+        """
+        Predicts the correspondent, document type, tags and storage path of
+        many documents at once. Each content is preprocessed and vectorized
+        only once, and every classifier predicts all documents in one call.
+
+        Returns four lists, each with one prediction per content, in the
+        same form as the respective predict_* method. Predictions which were
+        not requested are left empty.
+        """
+        from sklearn.utils.multiclass import type_of_target
+
+        contents = list(contents)
+        classifiers = (
+            self.correspondent_classifier if correspondents else None,
+            self.document_type_classifier if document_types else None,
+            self.storage_path_classifier if storage_paths else None,
+        )
+        tags_classifier = self.tags_classifier if tags else None
+        if not tags_classifier and not any(classifiers):
+            return (
+                [None] * len(contents),
+                [None] * len(contents),
+                [[] for _ in contents],
+                [None] * len(contents),
+            )
+
+        X = self.data_vectorizer.transform(
+            [self.preprocess_content(content) for content in contents],
+        )
+
+        correspondent_ids, document_type_ids, storage_path_ids = (
+            [
+                int(pred_id) if pred_id != -1 else None
+                for pred_id in classifier.predict(X)
+            ]
+            if classifier
+            else [None] * len(contents)
+            for classifier in classifiers
+        )
+
+        if tags_classifier:
+            y = tags_classifier.predict(X)
+            target = type_of_target(y)
+            tag_ids = []
+            for tags_ids in self.tags_binarizer.inverse_transform(y):
+                if target.startswith("multilabel"):
+                    tag_ids.append([int(tag_id) for tag_id in tags_ids])
+                elif target == "binary" and tags_ids != -1:
+                    tag_ids.append([int(tags_ids)])
+                else:
+                    tag_ids.append([])
+        else:
+            tag_ids = [[] for _ in contents]
+
+        return correspondent_ids, document_type_ids, tag_ids, storage_path_ids
+
     def predict_storage_path(self, content):
         if self.storage_path_classifier:
             X = self.data_vectorizer.transform([self.preprocess_content(content)])
@@ -1,13 +1,19 @@
+import itertools
 import logging
 import math
 import os
+import threading
 from contextlib import contextmanager
+from functools import cached_property
+from functools import lru_cache
 
 from dateutil.parser import isoparse
 from django.conf import settings
+from django.db.models import Prefetch
 from django.utils import timezone
 from documents.models import Comment
 from documents.models import Document
+from documents.models import Tag
 from whoosh import classify
 from whoosh import highlight
 from whoosh import query
@@ -29,12 +35,21 @@ from whoosh.writing import AsyncWriter
 
 logger = logging.getLogger("paperless.index")
 
+# Let the writer buffer more postings in memory before flushing a segment,
+# since bulk updates write many documents per commit.
+BULK_WRITER_ARGS = {"limitmb": 256}
 
+_index = None
+_index_dir = None
+_index_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
 def get_schema():
     return Schema(
         id=NUMERIC(stored=True, unique=True),
         title=TEXT(sortable=True),
-        content=TEXT(),
+        content=TEXT(vector=True),
         asn=NUMERIC(sortable=True, signed=False),
         correspondent=TEXT(sortable=True),
         correspondent_id=NUMERIC(),
@@ -55,7 +70,43 @@ def get_schema():
     )
 
 
+def get_index_queryset(queryset=None):
+    """
+    Returns the given queryset of documents (or all documents) with every
+    relation read by update_document() loaded up front, so that indexing
+    many documents doesn't issue several queries per document.
+    """
+    if queryset is None:
+        queryset = Document.objects.all()
+    return queryset.select_related(
+        "correspondent",
+        "document_type",
+        "storage_path",
+    ).prefetch_related(
+        Prefetch("tags", queryset=Tag.objects.only("id", "name")),
+        Prefetch(
+            "documents",
+            queryset=Comment.objects.only("id", "document_id", "comment"),
+        ),
+    )
+
+
 def open_index(recreate=False):
+    """
+    Returns the index, opening it only once per process and index directory.
+    Readers and writers created from the returned index always use its
+    latest committed generation, so the handle itself can be reused.
+    """
+    global _index, _index_dir
+
+    with _index_lock:
+        if recreate or _index is None or _index_dir != settings.INDEX_DIR:
+            _index = _open_index(recreate=recreate)
+            _index_dir = settings.INDEX_DIR
+        return _index
+
+
+def _open_index(recreate=False):
     try:
         if exists_in(settings.INDEX_DIR) and not recreate:
             return open_dir(settings.INDEX_DIR, schema=get_schema())
@@ -68,8 +119,8 @@ def open_index(recreate=False):
 
 
 @contextmanager
-def open_index_writer(optimize=False):
-    writer = AsyncWriter(open_index())
+def open_index_writer(optimize=False, writerargs=None):
+    writer = AsyncWriter(open_index(), writerargs=writerargs)
 
     try:
         yield writer
@@ -91,9 +142,15 @@ def open_index_searcher():
 
 
 def update_document(writer: AsyncWriter, doc: Document):
-    tags = ",".join([t.name for t in doc.tags.all()])
-    tags_ids = ",".join([str(t.id) for t in doc.tags.all()])
-    comments = ",".join([str(c.comment) for c in Comment.objects.filter(document=doc)])
+    # Read related objects once, so that callers passing documents from a
+    # prefetched queryset (see get_index_queryset) don't trigger any queries.
+    tag_objects = list(doc.tags.all())
+    tags = ",".join([t.name for t in tag_objects])
+    tags_ids = ",".join([str(t.id) for t in tag_objects])
+    comments = ",".join([str(c.comment) for c in doc.documents.all()])
+    correspondent = doc.correspondent
+    document_type = doc.document_type
+    storage_path = doc.storage_path
     asn = doc.archive_serial_number
     if asn is not None and (
         asn < Document.ARCHIVE_SERIAL_NUMBER_MIN
@@ -110,22 +167,22 @@ def update_document(writer: AsyncWriter, doc: Document):
         id=doc.pk,
         title=doc.title,
         content=doc.content,
-        correspondent=doc.correspondent.name if doc.correspondent else None,
-        correspondent_id=doc.correspondent.id if doc.correspondent else None,
-        has_correspondent=doc.correspondent is not None,
+        correspondent=correspondent.name if correspondent else None,
+        correspondent_id=correspondent.id if correspondent else None,
+        has_correspondent=correspondent is not None,
         tag=tags if tags else None,
         tag_id=tags_ids if tags_ids else None,
         has_tag=len(tags) > 0,
-        type=doc.document_type.name if doc.document_type else None,
-        type_id=doc.document_type.id if doc.document_type else None,
-        has_type=doc.document_type is not None,
+        type=document_type.name if document_type else None,
+        type_id=document_type.id if document_type else None,
+        has_type=document_type is not None,
         created=doc.created,
         added=doc.added,
         asn=asn,
         modified=doc.modified,
-        path=doc.storage_path.name if doc.storage_path else None,
-        path_id=doc.storage_path.id if doc.storage_path else None,
-        has_path=doc.storage_path is not None,
+        path=storage_path.name if storage_path else None,
+        path_id=storage_path.id if storage_path else None,
+        has_path=storage_path is not None,
         comments=comments,
     )
 
@@ -148,11 +205,39 @@ def remove_document_from_index(document):
         remove_document(writer, document)
 
 
+def bulk_update_documents(documents, batch_size=100):
+    """
+    Adds or updates many documents, sharing one index writer (and thus one
+    commit) per batch_size documents instead of committing every document.
+    With batch_size=None, all documents are committed at once. Documents are
+    consumed lazily, so an iterator over a queryset never holds more than
+    its current chunk in memory.
+    """
+    documents = iter(documents)
+    for first in documents:
+        batch = itertools.chain(
+            [first],
+            itertools.islice(
+                documents,
+                batch_size - 1 if batch_size is not None else None,
+            ),
+        )
+        with open_index_writer(writerargs=BULK_WRITER_ARGS) as writer:
+            for document in batch:
+                update_document(writer, document)
+
+
 class DelayedQuery:
     def _get_query(self):
         raise NotImplementedError()
 
-    def _get_query_filter(self):
+    @cached_property
+    def _query(self):
+        # Built once, since every page of the results uses the same query.
+        return self._get_query()
+
+    @cached_property
+    def _query_filter(self):
         criterias = []
         for k, v in self.query_params.items():
             if k == "correspondent__id":
@@ -193,7 +278,8 @@ class DelayedQuery:
         else:
             return None
 
-    def _get_query_sortedby(self):
+    @cached_property
+    def _query_sortedby(self):
         if "ordering" not in self.query_params:
             return None, False
 
@@ -235,13 +321,13 @@ class DelayedQuery:
         if item.start in self.saved_results:
             return self.saved_results[item.start]
 
-        q, mask = self._get_query()
-        sortedby, reverse = self._get_query_sortedby()
+        q, mask = self._query
+        sortedby, reverse = self._query_sortedby
 
         page: ResultsPage = self.searcher.search_page(
             q,
             mask=mask,
-            filter=self._get_query_filter(),
+            filter=self._query_filter,
             pagenum=math.floor(item.start / self.page_size) + 1,
             pagelen=self.page_size,
             sortedby=sortedby,
@@ -253,15 +339,11 @@ class DelayedQuery:
         if not self.first_score and len(page.results) > 0 and sortedby is None:
             self.first_score = page.results[0].score
 
-        page.results.top_n = list(
-            map(
-                lambda hit: (
-                    (hit[0] / self.first_score) if self.first_score else None,
-                    hit[1],
-                ),
-                page.results.top_n,
-            ),
-        )
+        first_score = self.first_score
+        page.results.top_n = [
+            (score / first_score if first_score else None, docnum)
+            for score, docnum in page.results.top_n
+        ]
 
         self.saved_results[item.start] = page
 
@@ -278,26 +360,35 @@ class DelayedFullTextQuery(DelayedQuery):
         qp.add_plugin(DateParserPlugin(basedate=timezone.now()))
         q = qp.parse(q_str)
 
-        corrected = self.searcher.correct_query(q, q_str)
-        if corrected.query != q:
-            corrected.query = corrected.string
-
         return q, None
 
 
 class DelayedMoreLikeThisQuery(DelayedQuery):
     def _get_query(self):
         more_like_doc_id = int(self.query_params["more_like_id"])
-        content = Document.objects.get(id=more_like_doc_id).content
 
         docnum = self.searcher.document_number(id=more_like_doc_id)
-        kts = self.searcher.key_terms_from_text(
+        if docnum is not None and self.searcher.ixreader.has_vector(
+            docnum,
             "content",
-            content,
-            numterms=20,
-            model=classify.Bo1Model,
-            normalize=False,
-        )
+        ):
+            kts = self.searcher.key_terms(
+                [docnum],
+                "content",
+                numterms=20,
+                model=classify.Bo1Model,
+                normalize=False,
+            )
+        else:
+            # The document was indexed before term vectors were stored.
+            content = Document.objects.get(id=more_like_doc_id).content
+            kts = self.searcher.key_terms_from_text(
+                "content",
+                content,
+                numterms=20,
+                model=classify.Bo1Model,
+                normalize=False,
+            )
         q = query.Or(
             [query.Term("content", word, boost=weight) for word, weight in kts],
         )
@@ -3,6 +3,7 @@ import logging
 import tqdm
 from django.core.management.base import BaseCommand
 from documents.classifier import load_classifier
+from documents.matching import match_all
 from documents.models import Document
 
 from ...signals.handlers import set_correspondent
@@ -78,7 +79,21 @@ class Command(BaseCommand):
 
         classifier = load_classifier()
 
-        for document in tqdm.tqdm(documents, disable=options["no_progress_bar"]):
+        matched_documents = match_all(
+            documents,
+            classifier,
+            correspondents=options["correspondent"],
+            document_types=options["document_type"],
+            tags=options["tags"],
+            storage_paths=options["storage_path"],
+            replace=options["overwrite"],
+        )
+
+        for document, matched in tqdm.tqdm(
+            matched_documents,
+            total=documents.count(),
+            disable=options["no_progress_bar"],
+        ):
 
             if options["correspondent"]:
                 set_correspondent(
@@ -90,6 +105,7 @@ class Command(BaseCommand):
                     suggest=options["suggest"],
                     base_url=options["base_url"],
                     color=color,
+                    matched=matched.get("correspondents"),
                 )
 
             if options["document_type"]:
@@ -102,6 +118,7 @@ class Command(BaseCommand):
                     suggest=options["suggest"],
                     base_url=options["base_url"],
                     color=color,
+                    matched=matched.get("document_types"),
                 )
 
             if options["tags"]:
@@ -113,6 +130,7 @@ class Command(BaseCommand):
                     suggest=options["suggest"],
                     base_url=options["base_url"],
                     color=color,
+                    matched=matched.get("tags"),
                 )
             if options["storage_path"]:
                 set_storage_path(
@@ -124,4 +142,5 @@ class Command(BaseCommand):
                     suggest=options["suggest"],
                     base_url=options["base_url"],
                     color=color,
+                    matched=matched.get("storage_paths"),
                 )
@@ -1,5 +1,7 @@
+import itertools
 import logging
 import re
+from functools import lru_cache
 
 from documents.models import Correspondent
 from documents.models import DocumentType
@@ -10,6 +12,9 @@ from documents.models import Tag
 
 logger = logging.getLogger("paperless.matching")
 
+_FINDTERMS = re.compile(r'"([^"]+)"|(\S+)')
+_NORMSPACE = re.compile(r"\s+")
+
 
 def log_reason(matching_model, document, reason):
     class_name = type(matching_model).__name__
@@ -27,9 +32,7 @@ def match_correspondents(document, classifier):
 
     correspondents = Correspondent.objects.all()
 
-    return list(
-        filter(lambda o: matches(o, document) or o.pk == pred_id, correspondents),
-    )
+    return _filter_matches(correspondents, document, [pred_id])
 
 
 def match_document_types(document, classifier):
@@ -40,9 +43,7 @@ def match_document_types(document, classifier):
 
     document_types = DocumentType.objects.all()
 
-    return list(
-        filter(lambda o: matches(o, document) or o.pk == pred_id, document_types),
-    )
+    return _filter_matches(document_types, document, [pred_id])
 
 
 def match_tags(document, classifier):
@@ -53,9 +54,7 @@ def match_tags(document, classifier):
 
     tags = Tag.objects.all()
 
-    return list(
-        filter(lambda o: matches(o, document) or o.pk in predicted_tag_ids, tags),
-    )
+    return _filter_matches(tags, document, predicted_tag_ids)
 
 
 def match_storage_paths(document, classifier):
@@ -66,16 +65,128 @@ def match_storage_paths(document, classifier):
 
     storage_paths = StoragePath.objects.all()
 
-    return list(
-        filter(
-            lambda o: matches(o, document) or o.pk == pred_id,
-            storage_paths,
-        ),
+    return _filter_matches(storage_paths, document, [pred_id])
+
+
+def match_all(
+    documents,
+    classifier,
+    correspondents=True,
+    document_types=True,
+    tags=True,
+    storage_paths=True,
+    replace=True,
+    batch_size=100,
+):
+    """
+    Matches many documents at once. The matching models are only fetched once,
+    and the classifier predicts batch_size documents per call.
+
+    Yields a (document, matched) tuple for every document, where matched maps
+    "correspondents", "document_types", "tags" and "storage_paths" (as far as
+    requested) to the same lists match_correspondents() etc. would return.
+    Without replace, documents which already have a correspondent, document
+    type or storage path are not matched for it, like set_correspondent()
+    etc. would skip them.
+    """
+    matching_models = {}
+    if correspondents:
+        matching_models["correspondents"] = list(Correspondent.objects.all())
+    if document_types:
+        matching_models["document_types"] = list(DocumentType.objects.all())
+    if tags:
+        matching_models["tags"] = list(Tag.objects.all())
+    if storage_paths:
+        matching_models["storage_paths"] = list(StoragePath.objects.all())
+
+    kept_fields = (
+        {}
+        if replace
+        else {
+            "correspondents": "correspondent_id",
+            "document_types": "document_type_id",
+            "storage_paths": "storage_path_id",
+        }
     )
 
+    documents = iter(documents)
+    while True:
+        batch = list(itertools.islice(documents, batch_size))
+        if not batch:
+            break
+
+        batch_kinds = [
+            [
+                kind
+                for kind in matching_models
+                if not (kind in kept_fields and getattr(document, kept_fields[kind]))
+            ]
+            for document in batch
+        ]
+        to_predict = [document for document, kinds in zip(batch, batch_kinds) if kinds]
+        requested = set().union(*batch_kinds)
+
+        if classifier and to_predict:
+            predictions = zip(
+                *classifier.predict_batch(
+                    [document.content for document in to_predict],
+                    correspondents="correspondents" in requested,
+                    document_types="document_types" in requested,
+                    tags="tags" in requested,
+                    storage_paths="storage_paths" in requested,
+                ),
+            )
+        else:
+            predictions = itertools.repeat((None, None, [], None))
+
+        for document, kinds in zip(batch, batch_kinds):
+            if not kinds:
+                yield document, {}
+                continue
+
+            pred_id, type_id, tag_ids, path_id = next(predictions)
+            predicted_ids = {
+                "correspondents": [pred_id],
+                "document_types": [type_id],
+                "tags": tag_ids,
+                "storage_paths": [path_id],
+            }
+            fuzzy_texts = {}
+            yield document, {
+                kind: _filter_matches(
+                    matching_models[kind],
+                    document,
+                    predicted_ids[kind],
+                    fuzzy_texts,
+                )
+                for kind in kinds
+            }
+
+
+def _filter_matches(matching_models, document, predicted_ids, fuzzy_texts=None):
+    # Shares the normalized content of the document between all fuzzy models
+    if fuzzy_texts is None:
+        fuzzy_texts = {}
+
+    # MATCH_AUTO models are only ever matched by the classifier.
+    return [
+        o
+        for o in matching_models
+        if (
+            o.matching_algorithm != MatchingModel.MATCH_AUTO
+            and matches(o, document, fuzzy_texts)
+        )
+        or o.pk in predicted_ids
+    ]
+
 
-def matches(matching_model, document):
-    search_kwargs = {}
+def matches(matching_model, document, fuzzy_texts=None):
+    """
+    Checks whether the matching model matches the document. fuzzy_texts may
+    be a dict shared by all calls for the same document, in which MATCH_FUZZY
+    keeps the normalized document content, so that it is only computed once.
+    """
+    flags = 0
 
     document_content = document.content
 
@@ -84,12 +195,18 @@ def matches(matching_model, document):
         return False
 
     if matching_model.is_insensitive:
-        search_kwargs = {"flags": re.IGNORECASE}
+        flags = re.IGNORECASE
 
     if matching_model.matching_algorithm == MatchingModel.MATCH_ALL:
-        for word in _split_match(matching_model):
-            search_result = re.search(rf"\b{word}\b", document_content, **search_kwargs)
-            if not search_result:
+        words = _split_match(matching_model)
+        # Matches of one word may hide overlapping matches of another from
+        # finditer(), so only the words it didn't find are searched again.
+        missing_words = set(words) - {
+            words[int(match.lastgroup[1:])]
+            for match in _word_alternation(words, flags).finditer(document_content)
+        }
+        for word in missing_words:
+            if not _search_word(word, flags, document_content):
                 return False
         log_reason(
             matching_model,
@@ -99,18 +216,28 @@ def matches(matching_model, document):
         return True
 
     elif matching_model.matching_algorithm == MatchingModel.MATCH_ANY:
-        for word in _split_match(matching_model):
-            if re.search(rf"\b{word}\b", document_content, **search_kwargs):
-                log_reason(matching_model, document, f"it contains this word: {word}")
-                return True
+        words = _split_match(matching_model)
+        match = _word_alternation(words, flags).search(document_content)
+        if match:
+            log_reason(
+                matching_model,
+                document,
+                f"it contains this word: {match.group()}",
+            )
+            return True
         return False
 
     elif matching_model.matching_algorithm == MatchingModel.MATCH_LITERAL:
-        result = bool(
-            re.search(
-                rf"\b{re.escape(matching_model.match)}\b",
+        # A plain substring check is much faster than the regex, and rules
+        # out most documents. Only hits need to check the word boundaries.
+        # Case folding and re.IGNORECASE disagree on some characters, like
+        # the Turkish dotted and dotless i, so case insensitive models always
+        # use the regex.
+        result = (
+            matching_model.is_insensitive or matching_model.match in document_content
+        ) and bool(
+            _compile(rf"\b{re.escape(matching_model.match)}\b", flags).search(
                 document_content,
-                **search_kwargs,
             ),
         )
         if result:
@@ -123,10 +250,7 @@ def matches(matching_model, document):
 
     elif matching_model.matching_algorithm == MatchingModel.MATCH_REGEX:
         try:
-            match = re.search(
-                re.compile(matching_model.match, **search_kwargs),
-                document_content,
-            )
+            match = _compile(matching_model.match, flags).search(document_content)
         except re.error:
             logger.error(
                 f"Error while processing regular expression " f"{matching_model.match}",
@@ -144,11 +268,14 @@ def matches(matching_model, document):
     elif matching_model.matching_algorithm == MatchingModel.MATCH_FUZZY:
         from rapidfuzz import fuzz
 
-        match = re.sub(r"[^\w\s]", "", matching_model.match)
-        text = re.sub(r"[^\w\s]", "", document_content)
-        if matching_model.is_insensitive:
-            match = match.lower()
-            text = text.lower()
+        lower = matching_model.is_insensitive
+        if fuzzy_texts is None:
+            fuzzy_texts = {}
+        if lower not in fuzzy_texts:
+            fuzzy_texts[lower] = _fuzzy_text(document_content, lower)
+
+        match = _fuzzy_text(matching_model.match, lower)
+        text = fuzzy_texts[lower]
         if fuzz.partial_ratio(match, text, score_cutoff=90):
             # TODO: make this better
             log_reason(
@@ -169,7 +296,47 @@ def matches(matching_model, document):
         raise NotImplementedError("Unsupported matching algorithm")
 
 
+def _search_word(word, flags, document_content):
+    return _compile(rf"\b{word}\b", flags).search(document_content)
+
+
+def _fuzzy_text(text, lower):
+    text = re.sub(r"[^\w\s]", "", text)
+    if lower:
+        text = text.lower()
+    return text
+
+
+@lru_cache(maxsize=4096)
+def _compile(pattern, flags=0):
+    """
+    Compiles and caches a pattern. The same matching models are evaluated
+    against every document, and the cache of the re module is small enough
+    for many models to evict each other.
+    """
+    return re.compile(pattern, flags)
+
+
+def _word_alternation(words, flags=0):
+    """
+    Returns a single pattern matching any of the words, so that the document
+    is only searched once. The group named "w<index>" tells which word
+    matched.
+    """
+    return _compile(
+        r"\b(?:"
+        + "|".join(f"(?P<w{i}>{word})" for i, word in enumerate(words))
+        + r")\b",
+        flags,
+    )
+
+
 def _split_match(matching_model):
+    return _split_match_text(matching_model.match)
+
+
+@lru_cache(maxsize=1024)
+def _split_match_text(match):
     """
     Splits the match to individual keywords, getting rid of unnecessary
     spaces and grouping quoted words together.
@@ -177,12 +344,13 @@ def _split_match(matching_model):
     Example:
       '  some random  words "with   quotes  " and   spaces'
         ==>
-      ["some", "random", "words", "with+quotes", "and", "spaces"]
+      ("some", "random", "words", "with+quotes", "and", "spaces")
     """
-    findterms = re.compile(r'"([^"]+)"|(\S+)').findall
-    normspace = re.compile(r"\s+").sub
-    return [
-        # normspace(" ", (t[0] or t[1]).strip()).replace(" ", r"\s+")
-        re.escape(normspace(" ", (t[0] or t[1]).strip())).replace(r"\ ", r"\s+")
-        for t in findterms(matching_model.match)
-    ]
+    return tuple(
+        # _NORMSPACE.sub(" ", (t[0] or t[1]).strip()).replace(" ", r"\s+")
+        re.escape(_NORMSPACE.sub(" ", (t[0] or t[1]).strip())).replace(
+            r"\ ",
+            r"\s+",
+        )
+        for t in _FINDTERMS.findall(match)
+    )
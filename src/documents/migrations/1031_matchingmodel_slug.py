@@ -0,0 +1,68 @@
+# Generated by Django 4.1.5 on 2026-10-15 21:02
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def set_slugs(apps, schema_editor):
+    for model_name in ("Correspondent", "DocumentType", "StoragePath", "Tag"):
+        model = apps.get_model("documents", model_name)
+        objects = list(model.objects.only("id", "name"))
+        for obj in objects:
+            obj.slug = slugify(obj.name)
+        model.objects.bulk_update(objects, ["slug"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "1030_alter_paperlesstask_task_file_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="correspondent",
+            name="slug",
+            field=models.SlugField(
+                blank=True,
+                db_index=False,
+                editable=False,
+                max_length=128,
+                verbose_name="slug",
+            ),
+        ),
+        migrations.AddField(
+            model_name="documenttype",
+            name="slug",
+            field=models.SlugField(
+                blank=True,
+                db_index=False,
+                editable=False,
+                max_length=128,
+                verbose_name="slug",
+            ),
+        ),
+        migrations.AddField(
+            model_name="storagepath",
+            name="slug",
+            field=models.SlugField(
+                blank=True,
+                db_index=False,
+                editable=False,
+                max_length=128,
+                verbose_name="slug",
+            ),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="slug",
+            field=models.SlugField(
+                blank=True,
+                db_index=False,
+                editable=False,
+                max_length=128,
+                verbose_name="slug",
+            ),
+        ),
+        migrations.RunPython(set_slugs, migrations.RunPython.noop),
+    ]
@@ -42,6 +42,14 @@ class MatchingModel(models.Model):
 
     name = models.CharField(_("name"), max_length=128, unique=True)
 
+    slug = models.SlugField(
+        _("slug"),
+        max_length=128,
+        blank=True,
+        editable=False,
+        db_index=False,
+    )
+
     match = models.CharField(_("match"), max_length=256, blank=True)
 
     matching_algorithm = models.PositiveIntegerField(
@@ -1,6 +1,7 @@
 import datetime
-import math
 import re
+import zipfile
+from string import Formatter
 
 from celery import states
 
@@ -10,7 +11,6 @@ except ImportError:
     import backports.zoneinfo as zoneinfo
 import magic
 from django.conf import settings
-from django.utils.text import slugify
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
@@ -28,6 +28,74 @@ from .models import UiSettings
 from .models import PaperlessTask
 from .parsers import is_mime_type_supported
 
+_COLOR_RE = re.compile(r"#[0-9a-fA-F]{6}")
+
+# Tags with a luminance below 0.53 get white text. Compared against the
+# squared luminance in integers: 0.53**2 * 256**2 * 1000 = 18409062.4
+_TEXT_COLOR_THRESHOLD = 18409063
+
+STORAGE_PATH_PLACEHOLDERS = frozenset(
+    (
+        "title",
+        "correspondent",
+        "document_type",
+        "created",
+        "created_year",
+        "created_year_short",
+        "created_month",
+        "created_month_name",
+        "created_month_name_short",
+        "created_day",
+        "added",
+        "added_year",
+        "added_year_short",
+        "added_month",
+        "added_month_name",
+        "added_month_name_short",
+        "added_day",
+        "asn",
+        "tags",
+        "tag_list",
+    ),
+)
+
+
+def _format_field_names(format_string):
+    """
+    Yields the names of all replacement fields in the format string,
+    including the ones nested in a format spec, like {created_year:{width}}
+    """
+    for _literal, field_name, spec, _conversion in Formatter().parse(format_string):
+        if field_name is not None:
+            yield field_name
+        if spec:
+            yield from _format_field_names(spec)
+
+
+_COMPRESSION_MAP = {
+    "none": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+
+def _validate_ids_exist(model, ids, name):
+    """
+    Fetch the primary keys of ids in one query and report duplicates or
+    missing objects by id.
+    """
+    unique_ids = set(ids)
+    if len(unique_ids) != len(ids):
+        raise serializers.ValidationError(f"{name} contains duplicate ids")
+    missing = unique_ids.difference(
+        model.objects.filter(id__in=unique_ids).values_list("id", flat=True),
+    )
+    if missing:
+        raise serializers.ValidationError(
+            f"{name} contains ids that don't exist: {sorted(missing)}",
+        )
+
 
 # https://www.django-rest-framework.org/api-guide/serializers/#example
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
@@ -55,10 +123,7 @@ class MatchingModelSerializer(serializers.ModelSerializer):
 
     document_count = serializers.IntegerField(read_only=True)
 
-    def get_slug(self, obj):
-        return slugify(obj.name)
-
-    slug = SerializerMethodField()
+    slug = serializers.CharField(read_only=True)
 
     def validate_match(self, match):
         if (
@@ -124,17 +189,17 @@ class ColorField(serializers.Field):
         (13, "#cccccc"),
     )
 
+    _ID_TO_COLOUR = dict(COLOURS)
+    _COLOUR_TO_ID = {color: id for id, color in COLOURS}
+
     def to_internal_value(self, data):
-        for id, color in self.COLOURS:
-            if id == data:
-                return color
-        raise serializers.ValidationError()
+        try:
+            return self._ID_TO_COLOUR[data]
+        except (KeyError, TypeError):
+            raise serializers.ValidationError()
 
     def to_representation(self, value):
-        for id, color in self.COLOURS:
-            if color == value:
-                return id
-        return 1
+        return self._COLOUR_TO_ID.get(value, 1)
 
 
 class TagSerializerVersion1(MatchingModelSerializer):
@@ -159,14 +224,9 @@ class TagSerializerVersion1(MatchingModelSerializer):
 class TagSerializer(MatchingModelSerializer):
     def get_text_color(self, obj):
         try:
-            h = obj.color.lstrip("#")
-            rgb = tuple(int(h[i : i + 2], 16) / 256 for i in (0, 2, 4))
-            luminance = math.sqrt(
-                0.299 * math.pow(rgb[0], 2)
-                + 0.587 * math.pow(rgb[1], 2)
-                + 0.114 * math.pow(rgb[2], 2),
-            )
-            return "#ffffff" if luminance < 0.53 else "#000000"
+            r, g, b = bytes.fromhex(obj.color.lstrip("#"))
+            luminance_squared = 299 * r * r + 587 * g * g + 114 * b * b
+            return "#ffffff" if luminance_squared < _TEXT_COLOR_THRESHOLD else "#000000"
         except ValueError:
             return "#000000"
 
@@ -188,8 +248,7 @@ class TagSerializer(MatchingModelSerializer):
         )
 
     def validate_color(self, color):
-        regex = r"#[0-9a-fA-F]{6}"
-        if not re.match(regex, color):
+        if not _COLOR_RE.fullmatch(color):
             raise serializers.ValidationError(_("Invalid color."))
         return color
 
@@ -214,6 +273,15 @@ class StoragePathField(serializers.PrimaryKeyRelatedField):
         return StoragePath.objects.all()
 
 
+class TruncatedCharField(serializers.CharField):
+    """
+    A CharField that only renders the first 550 characters of its value.
+    """
+
+    def to_representation(self, value):
+        return str(value[0:550])
+
+
 class DocumentSerializer(DynamicFieldsModelSerializer):
 
     correspondent = CorrespondentField(allow_null=True)
@@ -225,6 +293,18 @@ class DocumentSerializer(DynamicFieldsModelSerializer):
     archived_file_name = SerializerMethodField()
     created_date = serializers.DateField(required=False)
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Fetch the relations rendered for every document up front. The file
+        names include the correspondent and the tags are listed by id.
+        """
+        return queryset.select_related(
+            "correspondent",
+            "document_type",
+            "storage_path",
+        ).prefetch_related("tags")
+
     def get_original_file_name(self, obj):
         return obj.get_public_filename()
 
@@ -234,11 +314,14 @@ class DocumentSerializer(DynamicFieldsModelSerializer):
         else:
             return None
 
-    def to_representation(self, instance):
-        doc = super().to_representation(instance)
-        if self.truncate_content:
-            doc["content"] = doc.get("content")[0:550]
-        return doc
+    def build_standard_field(self, field_name, model_field):
+        field_class, field_kwargs = super().build_standard_field(
+            field_name,
+            model_field,
+        )
+        if field_name == "content" and self.truncate_content:
+            field_class = TruncatedCharField
+        return field_class, field_kwargs
 
     def update(self, instance, validated_data):
         if "created_date" in validated_data and "created" not in validated_data:
@@ -310,17 +393,23 @@ class SavedViewSerializer(serializers.ModelSerializer):
         super().update(instance, validated_data)
         if rules_data is not None:
             SavedViewFilterRule.objects.filter(saved_view=instance).delete()
-            for rule_data in rules_data:
-                SavedViewFilterRule.objects.create(saved_view=instance, **rule_data)
+            self._create_filter_rules(instance, rules_data)
         return instance
 
     def create(self, validated_data):
         rules_data = validated_data.pop("filter_rules")
         saved_view = SavedView.objects.create(**validated_data)
-        for rule_data in rules_data:
-            SavedViewFilterRule.objects.create(saved_view=saved_view, **rule_data)
+        self._create_filter_rules(saved_view, rules_data)
         return saved_view
 
+    def _create_filter_rules(self, saved_view, rules_data):
+        SavedViewFilterRule.objects.bulk_create(
+            [
+                SavedViewFilterRule(saved_view=saved_view, **rule_data)
+                for rule_data in rules_data
+            ],
+        )
+
 
 class DocumentListSerializer(serializers.Serializer):
 
@@ -332,15 +421,11 @@ class DocumentListSerializer(serializers.Serializer):
     )
 
     def _validate_document_id_list(self, documents, name="documents"):
-        if not type(documents) == list:
+        if not isinstance(documents, list):
             raise serializers.ValidationError(f"{name} must be a list")
-        if not all([type(i) == int for i in documents]):
+        if not all(type(i) is int for i in documents):
             raise serializers.ValidationError(f"{name} must be a list of integers")
-        count = Document.objects.filter(id__in=documents).count()
-        if not count == len(documents):
-            raise serializers.ValidationError(
-                f"Some documents in {name} don't exist or were " f"specified twice.",
-            )
+        _validate_ids_exist(Document, documents, name)
 
     def validate_documents(self, documents):
         self._validate_document_id_list(documents)
@@ -349,17 +434,19 @@ class DocumentListSerializer(serializers.Serializer):
 
 class BulkEditSerializer(DocumentListSerializer):
 
+    METHODS = (
+        "set_correspondent",
+        "set_document_type",
+        "set_storage_path",
+        "add_tag",
+        "remove_tag",
+        "modify_tags",
+        "delete",
+        "redo_ocr",
+    )
+
     method = serializers.ChoiceField(
-        choices=[
-            "set_correspondent",
-            "set_document_type",
-            "set_storage_path",
-            "add_tag",
-            "remove_tag",
-            "modify_tags",
-            "delete",
-            "redo_ocr",
-        ],
+        choices=METHODS,
         label="Method",
         write_only=True,
     )
@@ -367,42 +454,22 @@ class BulkEditSerializer(DocumentListSerializer):
     parameters = serializers.DictField(allow_empty=True)
 
     def _validate_tag_id_list(self, tags, name="tags"):
-        if not type(tags) == list:
+        if not isinstance(tags, list):
             raise serializers.ValidationError(f"{name} must be a list")
-        if not all([type(i) == int for i in tags]):
+        if not all(type(i) is int for i in tags):
             raise serializers.ValidationError(f"{name} must be a list of integers")
-        count = Tag.objects.filter(id__in=tags).count()
-        if not count == len(tags):
-            raise serializers.ValidationError(
-                f"Some tags in {name} don't exist or were specified twice.",
-            )
+        _validate_ids_exist(Tag, tags, name)
 
     def validate_method(self, method):
-        if method == "set_correspondent":
-            return bulk_edit.set_correspondent
-        elif method == "set_document_type":
-            return bulk_edit.set_document_type
-        elif method == "set_storage_path":
-            return bulk_edit.set_storage_path
-        elif method == "add_tag":
-            return bulk_edit.add_tag
-        elif method == "remove_tag":
-            return bulk_edit.remove_tag
-        elif method == "modify_tags":
-            return bulk_edit.modify_tags
-        elif method == "delete":
-            return bulk_edit.delete
-        elif method == "redo_ocr":
-            return bulk_edit.redo_ocr
-        else:
+        if method not in self.METHODS:
             raise serializers.ValidationError("Unsupported method.")
+        # the method names match the bulk_edit functions
+        return getattr(bulk_edit, method)
 
     def _validate_parameters_tags(self, parameters):
         if "tag" in parameters:
             tag_id = parameters["tag"]
-            try:
-                Tag.objects.get(id=tag_id)
-            except Tag.DoesNotExist:
+            if not Tag.objects.filter(id=tag_id).exists():
                 raise serializers.ValidationError("Tag does not exist")
         else:
             raise serializers.ValidationError("tag not specified")
@@ -413,9 +480,7 @@ class BulkEditSerializer(DocumentListSerializer):
             if document_type_id is None:
                 # None is ok
                 return
-            try:
-                DocumentType.objects.get(id=document_type_id)
-            except DocumentType.DoesNotExist:
+            if not DocumentType.objects.filter(id=document_type_id).exists():
                 raise serializers.ValidationError("Document type does not exist")
         else:
             raise serializers.ValidationError("document_type not specified")
@@ -425,9 +490,7 @@ class BulkEditSerializer(DocumentListSerializer):
             correspondent_id = parameters["correspondent"]
             if correspondent_id is None:
                 return
-            try:
-                Correspondent.objects.get(id=correspondent_id)
-            except Correspondent.DoesNotExist:
+            if not Correspondent.objects.filter(id=correspondent_id).exists():
                 raise serializers.ValidationError("Correspondent does not exist")
         else:
             raise serializers.ValidationError("correspondent not specified")
@@ -437,9 +500,7 @@ class BulkEditSerializer(DocumentListSerializer):
             storage_path_id = parameters["storage_path"]
             if storage_path_id is None:
                 return
-            try:
-                StoragePath.objects.get(id=storage_path_id)
-            except StoragePath.DoesNotExist:
+            if not StoragePath.objects.filter(id=storage_path_id).exists():
                 raise serializers.ValidationError(
                     "Storage path does not exist",
                 )
@@ -521,15 +582,20 @@ class PostDocumentSerializer(serializers.Serializer):
     )
 
     def validate_document(self, document):
-        document_data = document.file.read()
-        mime_type = magic.from_buffer(document_data, mime=True)
+        if hasattr(document, "temporary_file_path"):
+            # Large uploads are already on disk, let libmagic read from there
+            # instead of loading the whole file into memory
+            mime_type = magic.from_file(document.temporary_file_path(), mime=True)
+        else:
+            mime_type = magic.from_buffer(document.read(), mime=True)
+            document.seek(0)
 
         if not is_mime_type_supported(mime_type):
             raise serializers.ValidationError(
                 _("File type %(type)s not supported") % {"type": mime_type},
             )
 
-        return document.name, document_data
+        return document.name, document
 
     def validate_correspondent(self, correspondent):
         if correspondent:
@@ -567,14 +633,7 @@ class BulkDownloadSerializer(DocumentListSerializer):
     )
 
     def validate_compression(self, compression):
-        import zipfile
-
-        return {
-            "none": zipfile.ZIP_STORED,
-            "deflated": zipfile.ZIP_DEFLATED,
-            "bzip2": zipfile.ZIP_BZIP2,
-            "lzma": zipfile.ZIP_LZMA,
-        }[compression]
+        return _COMPRESSION_MAP[compression]
 
 
 class StoragePathSerializer(MatchingModelSerializer):
@@ -593,32 +652,15 @@ class StoragePathSerializer(MatchingModelSerializer):
 
     def validate_path(self, path):
         try:
-            path.format(
-                title="title",
-                correspondent="correspondent",
-                document_type="document_type",
-                created="created",
-                created_year="created_year",
-                created_year_short="created_year_short",
-                created_month="created_month",
-                created_month_name="created_month_name",
-                created_month_name_short="created_month_name_short",
-                created_day="created_day",
-                added="added",
-                added_year="added_year",
-                added_year_short="added_year_short",
-                added_month="added_month",
-                added_month_name="added_month_name",
-                added_month_name_short="added_month_name_short",
-                added_day="added_day",
-                asn="asn",
-                tags="tags",
-                tag_list="tag_list",
-            )
-
-        except (KeyError):
+            field_names = set(_format_field_names(path))
+        except ValueError:
             raise serializers.ValidationError(_("Invalid variable detected."))
 
+        for field_name in field_names:
+            # {tags[type]} and similar index into one of the placeholders
+            if field_name.partition("[")[0] not in STORAGE_PATH_PLACEHOLDERS:
+                raise serializers.ValidationError(_("Invalid variable detected."))
+
         return path
 
 
@@ -696,15 +738,11 @@ class AcknowledgeTasksViewSerializer(serializers.Serializer):
 
     def _validate_task_id_list(self, tasks, name="tasks"):
         pass
-        if not type(tasks) == list:
+        if not isinstance(tasks, list):
             raise serializers.ValidationError(f"{name} must be a list")
-        if not all([type(i) == int for i in tasks]):
+        if not all(type(i) is int for i in tasks):
             raise serializers.ValidationError(f"{name} must be a list of integers")
-        count = PaperlessTask.objects.filter(id__in=tasks).count()
-        if not count == len(tasks):
-            raise serializers.ValidationError(
-                f"Some tasks in {name} don't exist or were specified twice.",
-            )
+        _validate_ids_exist(PaperlessTask, tasks, name)
 
     def validate_tasks(self, tasks):
         self._validate_task_id_list(tasks)
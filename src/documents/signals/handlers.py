@@ -18,15 +18,19 @@ from django.db.models import Q
 from django.dispatch import receiver
 from django.utils import termcolors
 from django.utils import timezone
+from django.utils.text import slugify
 from filelock import FileLock
 
 from .. import matching
 from ..file_handling import create_source_path_directory
 from ..file_handling import delete_empty_directories
 from ..file_handling import generate_unique_filename
+from ..models import Correspondent
 from ..models import Document
+from ..models import DocumentType
 from ..models import MatchingModel
 from ..models import PaperlessTask
+from ..models import StoragePath
 from ..models import Tag
 
 logger = logging.getLogger("paperless.handlers")
@@ -47,12 +51,15 @@ def set_correspondent(
     suggest=False,
     base_url=None,
     color=False,
+    matched=None,
     **kwargs,
 ):
     if document.correspondent and not replace:
         return
 
-    potential_correspondents = matching.match_correspondents(document, classifier)
+    if matched is None:
+        matched = matching.match_correspondents(document, classifier)
+    potential_correspondents = matched
 
     potential_count = len(potential_correspondents)
     if potential_correspondents:
@@ -113,12 +120,15 @@ def set_document_type(
     suggest=False,
     base_url=None,
     color=False,
+    matched=None,
     **kwargs,
 ):
     if document.document_type and not replace:
         return
 
-    potential_document_type = matching.match_document_types(document, classifier)
+    if matched is None:
+        matched = matching.match_document_types(document, classifier)
+    potential_document_type = matched
 
     potential_count = len(potential_document_type)
     if potential_document_type:
@@ -179,6 +189,7 @@ def set_tags(
     suggest=False,
     base_url=None,
     color=False,
+    matched=None,
     **kwargs,
 ):
 
@@ -191,7 +202,9 @@ def set_tags(
 
     current_tags = set(document.tags.all())
 
-    matched_tags = matching.match_tags(document, classifier)
+    if matched is None:
+        matched = matching.match_tags(document, classifier)
+    matched_tags = matched
 
     relevant_tags = set(matched_tags) - current_tags
 
@@ -245,15 +258,15 @@ def set_storage_path(
     suggest=False,
     base_url=None,
     color=False,
+    matched=None,
     **kwargs,
 ):
     if document.storage_path and not replace:
         return
 
-    potential_storage_path = matching.match_storage_paths(
-        document,
-        classifier,
-    )
+    if matched is None:
+        matched = matching.match_storage_paths(document, classifier)
+    potential_storage_path = matched
 
     potential_count = len(potential_storage_path)
     if potential_storage_path:
@@ -305,6 +318,14 @@ def set_storage_path(
             document.save(update_fields=("storage_path",))
 
 
+@receiver(models.signals.pre_save, sender=Correspondent)
+@receiver(models.signals.pre_save, sender=DocumentType)
+@receiver(models.signals.pre_save, sender=StoragePath)
+@receiver(models.signals.pre_save, sender=Tag)
+def update_matching_model_slug(sender, instance, **kwargs):
+    instance.slug = slugify(instance.name)
+
+
 @receiver(models.signals.post_delete, sender=Document)
 def cleanup_document_deletion(sender, instance, using, **kwargs):
     with FileLock(settings.MEDIA_LOCK):
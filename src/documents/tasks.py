@@ -47,13 +47,20 @@ def index_optimize():
 
 
 def index_reindex(progress_bar_disable=False):
-    documents = Document.objects.all()
-
-    ix = index.open_index(recreate=True)
-
-    with AsyncWriter(ix) as writer:
-        for document in tqdm.tqdm(documents, disable=progress_bar_disable):
-            index.update_document(writer, document)
+    documents = index.get_index_queryset()
+
+    index.open_index(recreate=True)
+
+    # Iterate in chunks, so that the content of all documents isn't held
+    # in the queryset cache at once.
+    index.bulk_update_documents(
+        tqdm.tqdm(
+            documents.iterator(chunk_size=100),
+            total=documents.count(),
+            disable=progress_bar_disable,
+        ),
+        batch_size=None,
+    )
 
 
 @shared_task
@@ -237,14 +244,10 @@ def sanity_check():
 def bulk_update_documents(document_ids):
     documents = Document.objects.filter(id__in=document_ids)
 
-    ix = index.open_index()
-
     for doc in documents:
         post_save.send(Document, instance=doc, created=False)
 
-    with AsyncWriter(ix) as writer:
-        for doc in documents:
-            index.update_document(writer, doc)
+    index.bulk_update_documents(index.get_index_queryset(documents))
 
 
 @shared_task
@@ -22,7 +22,9 @@ except ImportError:
 import pytest
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
 from documents import bulk_edit
@@ -165,6 +167,60 @@ class TestDocumentApi(DirectoriesMixin, APITestCase):
         results = response.data["results"]
         self.assertEqual(len(results[0]), 0)
 
+    def test_document_truncate_content(self):
+        Document.objects.create(
+            title="long",
+            content="a" * 1000,
+            checksum="123",
+            mime_type="application/pdf",
+        )
+
+        response = self.client.get("/api/documents/?truncate_content=true")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["content"], "a" * 550)
+
+        response = self.client.get("/api/documents/")
+        self.assertEqual(response.data["results"][0]["content"], "a" * 1000)
+
+        response = self.client.get(
+            "/api/documents/?truncate_content=true&fields=id,title",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("content", response.data["results"][0])
+
+    def test_document_list_query_count(self):
+        """
+        GIVEN:
+            - Documents with a correspondent and tags
+        WHEN:
+            - The document list is requested
+        THEN:
+            - The number of queries does not grow with the number of documents
+        """
+        c = Correspondent.objects.create(name="c")
+        tags = [Tag.objects.create(name=f"t{i}") for i in range(2)]
+
+        def create_documents(start, count):
+            for i in range(start, start + count):
+                doc = Document.objects.create(
+                    title=f"doc{i}",
+                    checksum=str(i),
+                    mime_type="application/pdf",
+                    correspondent=c,
+                )
+                doc.tags.set(tags)
+
+        create_documents(0, 2)
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get("/api/documents/")
+        self.assertEqual(response.data["count"], 2)
+
+        create_documents(2, 5)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get("/api/documents/")
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(len(few), len(many))
+
     def test_document_actions(self):
 
         _, filename = tempfile.mkstemp(dir=self.dirs.originals_dir)
@@ -1110,6 +1166,34 @@ class TestDocumentApi(DirectoriesMixin, APITestCase):
         self.assertIsNone(kwargs["override_document_type_id"])
         self.assertIsNone(kwargs["override_tag_ids"])
 
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    @mock.patch("documents.views.consume_file.delay")
+    def test_upload_temporary_file(self, m):
+        """
+        GIVEN:
+            - An upload larger than FILE_UPLOAD_MAX_MEMORY_SIZE
+        WHEN:
+            - The document is posted
+        THEN:
+            - The mime type is detected from the temporary upload file
+            - The file is copied unchanged to the scratch directory
+        """
+        m.return_value = celery.result.AsyncResult(id=str(uuid.uuid4()))
+
+        sample = os.path.join(os.path.dirname(__file__), "samples", "simple.pdf")
+        with open(sample, "rb") as f:
+            response = self.client.post(
+                "/api/documents/post_document/",
+                {"document": f},
+            )
+
+        self.assertEqual(response.status_code, 200)
+
+        m.assert_called_once()
+
+        args, kwargs = m.call_args
+        self.assertEqual(Path(args[0]).read_bytes(), Path(sample).read_bytes())
+
     @mock.patch("documents.views.consume_file.delay")
     def test_upload_invalid_form(self, m):
 
@@ -1868,6 +1952,19 @@ class TestDocumentApiV2(DirectoriesMixin, APITestCase):
             "#000000",
         )
 
+    def test_slug(self):
+        for name, slug in [
+            ("Tom's  Bank -- Ltd.", "toms-bank-ltd"),
+            ("_under_score_", "under_score"),
+            ("Müller & Söhne", "muller-sohne"),
+            ("Ærø", "r"),
+        ]:
+            c = Correspondent.objects.create(name=name)
+            self.assertEqual(
+                self.client.get(f"/api/correspondents/{c.id}/").data["slug"],
+                slug,
+            )
+
 
 class TestApiUiSettings(DirectoriesMixin, APITestCase):
 
@@ -2398,6 +2495,36 @@ class TestBulkEdit(DirectoriesMixin, APITestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(Document.objects.count(), 5)
 
+    def test_api_invalid_doc_reports_ids(self):
+        response = self.client.post(
+            "/api/documents/bulk_edit/",
+            json.dumps(
+                {
+                    "documents": [self.doc2.id, -235, -12],
+                    "method": "delete",
+                    "parameters": {},
+                },
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("[-235, -12]", str(response.data["documents"]))
+
+        response = self.client.post(
+            "/api/documents/bulk_edit/",
+            json.dumps(
+                {
+                    "documents": [self.doc2.id, self.doc2.id],
+                    "method": "delete",
+                    "parameters": {},
+                },
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("duplicate ids", str(response.data["documents"]))
+        self.assertEqual(Document.objects.count(), 5)
+
     def test_api_invalid_method(self):
         self.assertEqual(Document.objects.count(), 5)
         response = self.client.post(
@@ -3223,6 +3350,35 @@ class TestApiStoragePaths(DirectoriesMixin, APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(StoragePath.objects.count(), 2)
 
+    def test_api_storage_path_placeholder_formats(self):
+        """
+        GIVEN:
+            - API requests to create storage paths with various placeholders
+        WHEN:
+            - API is called
+        THEN:
+            - Indexed placeholders are accepted
+            - Positional, unknown and malformed placeholders are rejected
+            - Placeholders nested in a format spec are checked as well
+        """
+        for path, status_code in [
+            ("{tags[type]}/{title}", 201),
+            ("{created_year:>4}/{title!s}", 201),
+            ("{}/{title}", 400),
+            ("{0}/{title}", 400),
+            ("{title.upper}", 400),
+            ("{title", 400),
+            ("title}", 400),
+            ("{created_year:{bogus}}", 400),
+            ("{created_year:>{created_day}}/{title}", 201),
+        ]:
+            response = self.client.post(
+                self.ENDPOINT,
+                json.dumps({"name": path, "path": path}),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, status_code, path)
+
 
 class TestTasks(DirectoriesMixin, APITestCase):
     ENDPOINT = "/api/tasks/"
@@ -164,6 +164,53 @@ class TestClassifier(DirectoriesMixin, TestCase):
         )
         self.assertEqual(self.classifier.predict_document_type(self.doc2.content), None)
 
+    def testPredictBatch(self):
+        self.generate_test_data()
+        self.classifier.train()
+        self.classifier.preprocess_content.reset_mock()
+
+        contents = [self.doc1.content, self.doc2.content]
+        self.assertEqual(
+            self.classifier.predict_batch(contents),
+            (
+                [self.c1.pk, None],
+                [self.dt.pk, None],
+                [[self.t1.pk], [self.t1.pk, self.t3.pk]],
+                [None, None],
+            ),
+        )
+        # content is preprocessed only once per document
+        self.assertEqual(self.classifier.preprocess_content.call_count, 2)
+
+    def testPredictBatchTags(self):
+        self.generate_test_data()
+        self.classifier.train()
+
+        contents = [self.doc1.content, self.doc2.content]
+        self.assertEqual(
+            self.classifier.predict_batch(
+                contents,
+                correspondents=False,
+                document_types=False,
+                storage_paths=False,
+            ),
+            (
+                [None, None],
+                [None, None],
+                [[self.t1.pk], [self.t1.pk, self.t3.pk]],
+                [None, None],
+            ),
+        )
+
+    def testPredictBatchEmpty(self):
+        Document.objects.create(title="WOW", checksum="3457", content="ASD")
+        self.classifier.train()
+
+        self.assertEqual(
+            self.classifier.predict_batch(["", "ASD"]),
+            ([None, None], [None, None], [[], []], [None, None]),
+        )
+
     def testDatasetHashing(self):
 
         self.generate_test_data()
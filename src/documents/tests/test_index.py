@@ -2,7 +2,10 @@ from unittest import mock
 
 from django.test import TestCase
 from documents import index
+from documents.models import Comment
+from documents.models import Correspondent
 from documents.models import Document
+from documents.models import Tag
 from documents.tests.utils import DirectoriesMixin
 
 
@@ -90,3 +93,153 @@ class TestAutoComplete(DirectoriesMixin, TestCase):
             _, kwargs = mocked_update_doc.call_args
 
             self.assertIsNone(kwargs["asn"])
+
+    def test_update_document_prefetched(self):
+        """
+        GIVEN:
+            - Documents with tags, a correspondent and comments
+        WHEN:
+            - Documents are provided to the index from the index queryset
+        THEN:
+            - No queries are made per document
+        """
+        correspondent = Correspondent.objects.create(name="c1")
+        tag1 = Tag.objects.create(name="t1")
+        tag2 = Tag.objects.create(name="t2")
+        for i in range(3):
+            doc = Document.objects.create(
+                title=f"doc{i}",
+                checksum=str(i),
+                content="test",
+                correspondent=correspondent,
+            )
+            doc.tags.add(tag1, tag2)
+            Comment.objects.create(document=doc, comment=f"comment {i}")
+
+        with mock.patch(
+            "documents.index.AsyncWriter.update_document",
+        ) as mocked_update_doc:
+            with index.open_index_writer() as writer:
+                # 1 for documents + related FKs, 1 for tags, 1 for comments
+                with self.assertNumQueries(3):
+                    for doc in index.get_index_queryset():
+                        index.update_document(writer, doc)
+
+            self.assertEqual(mocked_update_doc.call_count, 3)
+            for _, kwargs in mocked_update_doc.call_args_list:
+                self.assertEqual(kwargs["correspondent"], "c1")
+                self.assertCountEqual(kwargs["tag"].split(","), ["t1", "t2"])
+                self.assertEqual(kwargs["comments"], f"comment {kwargs['title'][3:]}")
+
+    def test_bulk_update_documents(self):
+        """
+        GIVEN:
+            - Several documents
+        WHEN:
+            - Documents are provided to the index in bulk
+        THEN:
+            - All documents are indexed
+            - One index writer is used per batch
+        """
+        docs = [
+            Document.objects.create(title=f"doc{i}", checksum=str(i), content="test")
+            for i in range(5)
+        ]
+
+        with mock.patch(
+            "documents.index.open_index_writer",
+            wraps=index.open_index_writer,
+        ) as mocked_writer:
+            index.bulk_update_documents(docs, batch_size=2)
+
+            self.assertEqual(mocked_writer.call_count, 3)
+
+        with index.open_index_searcher() as searcher:
+            self.assertEqual(searcher.doc_count(), 5)
+
+    def test_more_like_this_term_vectors(self):
+        """
+        GIVEN:
+            - Indexed documents
+        WHEN:
+            - A more like this query is built for one of them
+        THEN:
+            - Key terms are taken from the stored term vectors
+            - Document content isn't loaded from the database
+        """
+        doc1 = Document.objects.create(
+            title="doc1",
+            checksum="A",
+            content="bank statement august",
+        )
+        doc2 = Document.objects.create(
+            title="doc2",
+            checksum="B",
+            content="bank statement september",
+        )
+        index.bulk_update_documents([doc1, doc2])
+
+        with index.open_index_searcher() as searcher:
+            more_like = index.DelayedMoreLikeThisQuery(
+                searcher,
+                {"more_like_id": str(doc1.id)},
+                page_size=10,
+            )
+            with self.assertNumQueries(0):
+                q, mask = more_like._get_query()
+
+            self.assertSetEqual(
+                {term.text for term in q.subqueries},
+                {"bank", "statement", "august"},
+            )
+            self.assertSetEqual(mask, {searcher.document_number(id=doc1.id)})
+
+    def test_open_index_cached(self):
+        """
+        GIVEN:
+            - An opened index
+        WHEN:
+            - The index is opened again
+        THEN:
+            - The already opened index is returned
+            - Unless the index is recreated
+        """
+        ix = index.open_index()
+
+        with mock.patch("documents.index.exists_in") as mocked_exists:
+            self.assertIs(index.open_index(), ix)
+            mocked_exists.assert_not_called()
+
+        recreated = index.open_index(recreate=True)
+        self.assertIsNot(recreated, ix)
+        self.assertIs(index.open_index(), recreated)
+
+    def test_delayed_query_built_once(self):
+        """
+        GIVEN:
+            - A full text query with filters
+        WHEN:
+            - Several pages of results are requested
+        THEN:
+            - The query and its filter are only built once
+        """
+        for i in range(3):
+            Document.objects.create(title=f"doc{i}", checksum=str(i), content="test")
+        index.bulk_update_documents(Document.objects.all())
+
+        with index.open_index_searcher() as searcher:
+            delayed_query = index.DelayedFullTextQuery(
+                searcher,
+                {"query": "test", "is_tagged": "false"},
+                page_size=1,
+            )
+            with mock.patch.object(
+                index.DelayedFullTextQuery,
+                "_get_query",
+                wraps=delayed_query._get_query,
+            ) as mocked_get_query:
+                self.assertEqual(len(delayed_query), 3)
+                self.assertEqual(len(delayed_query[1:2]), 3)
+                self.assertEqual(len(delayed_query[2:3]), 3)
+
+                mocked_get_query.assert_called_once()
@@ -2,6 +2,7 @@ import shutil
 import tempfile
 from random import randint
 from typing import Iterable
+from unittest import mock
 
 from django.contrib.admin.models import LogEntry
 from django.contrib.auth.models import User
@@ -94,6 +95,22 @@ class TestMatching(_TestMatchingBase):
             ),
         )
 
+    def test_match_all_turkish_i(self):
+        self._test_matching(
+            '"vergi dairesi" istanbul',
+            "MATCH_ALL",
+            ("VERGİ DAİRESİ İSTANBUL",),
+            ("VERGİ DAİRESİ ANKARA",),
+        )
+
+    def test_match_all_overlapping(self):
+        self._test_matching(
+            '"new york" "york city"',
+            "MATCH_ALL",
+            ("I live in new york city",),
+            ("I live in new york", "I live in york city"),
+        )
+
     def test_match_any(self):
 
         self._test_matching(
@@ -139,6 +156,13 @@ class TestMatching(_TestMatchingBase):
             ("the lazy fox jumped over the brown dogs",),
         )
 
+        self._test_matching(
+            "istanbul ankara",
+            "MATCH_ANY",
+            ("I live in İSTANBUL",),
+            ("I live in İZMİR",),
+        )
+
     def test_match_literal(self):
 
         self._test_matching(
@@ -174,6 +198,27 @@ class TestMatching(_TestMatchingBase):
             ),
         )
 
+        self._test_matching(
+            "Ärger Straße",
+            "MATCH_LITERAL",
+            ("I have ÄRGER STRAẞE in me", "I have ärger straße in me"),
+            ("I have ärger strasse in me", "I have ärgere straße in me"),
+        )
+
+        self._test_matching(
+            "istanbul",
+            "MATCH_LITERAL",
+            ("I live in İSTANBUL", "I live in Istanbul"),
+            ("I live in istanbullu",),
+        )
+
+        self._test_matching(
+            "ısı",
+            "MATCH_LITERAL",
+            ("I have ISI in me",),
+            ("I have ısıtıcı in me",),
+        )
+
     def test_match_regex(self):
 
         self._test_matching(
@@ -212,6 +257,27 @@ class TestMatching(_TestMatchingBase):
             ("1220 Main Street, Springfield, Mich.",),
         )
 
+    def test_match_fuzzy_normalizes_content_once(self):
+        for i in range(3):
+            Tag.objects.create(
+                name=f"tag {i}",
+                match=f"Springfield {i}",
+                matching_algorithm=Tag.MATCH_FUZZY,
+            )
+        doc = Document(content="1220 Main Street, Springfield, Miss.")
+
+        with mock.patch.object(
+            matching,
+            "_fuzzy_text",
+            wraps=matching._fuzzy_text,
+        ) as fuzzy_text:
+            matching.match_tags(doc, None)
+
+        self.assertEqual(
+            [call.args[0] for call in fuzzy_text.call_args_list].count(doc.content),
+            1,
+        )
+
 
 class TestCaseSensitiveMatching(_TestMatchingBase):
     def test_match_all(self):
@@ -376,6 +442,102 @@ class TestCaseSensitiveMatching(_TestMatchingBase):
         )
 
 
+class TestMatchAll(TestCase):
+    def test_match_all(self):
+        """
+        GIVEN:
+            - Several documents and matching models
+        WHEN:
+            - All documents are matched at once
+        THEN:
+            - Results are the same as matching each document on its own
+            - Matching models are fetched only once
+        """
+        Tag.objects.create(name="t1", match="alpha", matching_algorithm=Tag.MATCH_ANY)
+        Tag.objects.create(name="t2", match="bravo", matching_algorithm=Tag.MATCH_ANY)
+        Correspondent.objects.create(
+            name="c1",
+            match="alpha bravo",
+            matching_algorithm=Correspondent.MATCH_ALL,
+        )
+        DocumentType.objects.create(
+            name="dt1",
+            match="charlie",
+            matching_algorithm=DocumentType.MATCH_LITERAL,
+        )
+        documents = [
+            Document(content="alpha"),
+            Document(content="alpha bravo"),
+            Document(content="charlie"),
+        ]
+
+        with self.assertNumQueries(3):
+            results = list(
+                matching.match_all(
+                    documents,
+                    None,
+                    storage_paths=False,
+                    batch_size=2,
+                ),
+            )
+
+        self.assertEqual(len(results), 3)
+        for document, matched in results:
+            self.assertNotIn("storage_paths", matched)
+            self.assertListEqual(
+                matched["correspondents"],
+                matching.match_correspondents(document, None),
+            )
+            self.assertListEqual(
+                matched["document_types"],
+                matching.match_document_types(document, None),
+            )
+            self.assertListEqual(matched["tags"], matching.match_tags(document, None))
+
+    def test_match_all_keep_existing(self):
+        """
+        GIVEN:
+            - A document with a correspondent and one without
+        WHEN:
+            - Both documents are matched without replacing existing values
+        THEN:
+            - Only the document without a correspondent is matched
+            - The classifier only predicts correspondents for that document
+        """
+        c1 = Correspondent.objects.create(
+            name="c1",
+            match="alpha",
+            matching_algorithm=Correspondent.MATCH_ANY,
+        )
+        documents = [
+            Document(content="alpha", correspondent=c1),
+            Document(content="alpha"),
+        ]
+        classifier = mock.Mock()
+        classifier.predict_batch.return_value = ([None], [None], [[]], [None])
+
+        results = list(
+            matching.match_all(
+                documents,
+                classifier,
+                document_types=False,
+                tags=False,
+                storage_paths=False,
+                replace=False,
+            ),
+        )
+
+        self.assertDictEqual(results[0][1], {})
+        self.assertDictEqual(results[1][1], {"correspondents": [c1]})
+        classifier.predict_batch.assert_called_once_with(
+            ["alpha"],
+            correspondents=True,
+            document_types=False,
+            tags=False,
+            storage_paths=False,
+        )
+
+
 @override_settings(POST_CONSUME_SCRIPT=None)
 class TestDocumentConsumptionFinishedSignal(TestCase):
     """
@@ -385,7 +547,7 @@ class TestDocumentConsumptionFinishedSignal(TestCase):
 
     def setUp(self):
         TestCase.setUp(self)
-        User.objects.create_user(username="test_consumer", password="12345")
+        User.objects.create(username="test_consumer")
         self.doc_contains = Document.objects.create(
             content="I contain the keyword.",
             mime_type="application/pdf",
@@ -0,0 +1,20 @@
+from documents.tests.utils import DirectoriesMixin
+from documents.tests.utils import TestMigrations
+
+
+class TestMigrateMatchingModelSlug(DirectoriesMixin, TestMigrations):
+
+    migrate_from = "1030_alter_paperlesstask_task_file_name"
+    migrate_to = "1031_matchingmodel_slug"
+
+    def setUpBeforeMigration(self, apps):
+        Correspondent = apps.get_model("documents", "Correspondent")
+        Tag = apps.get_model("documents", "Tag")
+        self.c_id = Correspondent.objects.create(name="Tom's Bank").id
+        self.t_id = Tag.objects.create(name="Müller & Söhne").id
+
+    def testSlugsPopulated(self):
+        Correspondent = self.apps.get_model("documents", "Correspondent")
+        Tag = self.apps.get_model("documents", "Tag")
+        self.assertEqual(Correspondent.objects.get(id=self.c_id).slug, "toms-bank")
+        self.assertEqual(Tag.objects.get(id=self.t_id).slug, "muller-sohne")
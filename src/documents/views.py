@@ -122,18 +122,14 @@ class IndexView(TemplateView):
         context["cookie_prefix"] = settings.COOKIE_PREFIX
         context["username"] = self.request.user.username
         context["full_name"] = self.request.user.get_full_name()
-        context["styles_css"] = f"frontend/{self.get_frontend_language()}/styles.css"
-        context["runtime_js"] = f"frontend/{self.get_frontend_language()}/runtime.js"
-        context[
-            "polyfills_js"
-        ] = f"frontend/{self.get_frontend_language()}/polyfills.js"
-        context["main_js"] = f"frontend/{self.get_frontend_language()}/main.js"
-        context[
-            "webmanifest"
-        ] = f"frontend/{self.get_frontend_language()}/manifest.webmanifest"  # noqa: E501
-        context[
-            "apple_touch_icon"
-        ] = f"frontend/{self.get_frontend_language()}/apple-touch-icon.png"  # noqa: E501
+        # resolve the language once for all frontend assets
+        frontend = f"frontend/{self.get_frontend_language()}"
+        context["styles_css"] = f"{frontend}/styles.css"
+        context["runtime_js"] = f"{frontend}/runtime.js"
+        context["polyfills_js"] = f"{frontend}/polyfills.js"
+        context["main_js"] = f"{frontend}/main.js"
+        context["webmanifest"] = f"{frontend}/manifest.webmanifest"
+        context["apple_touch_icon"] = f"{frontend}/apple-touch-icon.png"
         return context
 
 
@@ -221,7 +217,7 @@ class DocumentViewSet(
     )
 
     def get_queryset(self):
-        return Document.objects.distinct()
+        return DocumentSerializer.setup_eager_loading(Document.objects.distinct())
 
     def get_serializer(self, *args, **kwargs):
         fields_param = self.request.query_params.get("fields", None)
@@ -618,7 +614,7 @@ class PostDocumentView(GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        doc_name, doc_data = serializer.validated_data.get("document")
+        doc_name, doc_file = serializer.validated_data.get("document")
         correspondent_id = serializer.validated_data.get("correspondent")
         document_type_id = serializer.validated_data.get("document_type")
         tag_ids = serializer.validated_data.get("tags")
@@ -633,7 +629,9 @@ class PostDocumentView(GenericAPIView):
             pathvalidate.sanitize_filename(doc_name),
         )
 
-        temp_file_path.write_bytes(doc_data)
+        with open(temp_file_path, "wb") as f:
+            for chunk in doc_file.chunks():
+                f.write(chunk)
 
         os.utime(temp_file_path, times=(t, t))
 
@@ -798,6 +798,7 @@ TIKA_GOTENBERG_ENDPOINT = os.getenv(
     "PAPERLESS_TIKA_GOTENBERG_ENDPOINT",
     "http://localhost:3000",
 )
+TIKA_LOCAL_FILE_ACCESS = __get_boolean("PAPERLESS_TIKA_LOCAL_FILE_ACCESS", "NO")
 
 if TIKA_ENABLED:
     INSTALLED_APPS.append("paperless_tika.apps.PaperlessTikaConfig")
@@ -1,5 +1,10 @@
+import datetime
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from urllib.parse import quote
 
 import dateutil.parser
 import requests
@@ -7,7 +12,125 @@ from django.conf import settings
 from documents.parsers import DocumentParser
 from documents.parsers import make_thumbnail_from_pdf
 from documents.parsers import ParseError
-from tika import parser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _make_session(max_retries) -> requests.Session:
+    """
+    A session with keep-alive connection pooling, so consecutive documents
+    reuse the connection to the server instead of opening a new one each time
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        max_retries=max_retries,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Used when consuming documents, where waiting for an overloaded server is
+# better than failing the document
+_SESSION = _make_session(
+    Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        # the conversions are safe to repeat, including Gotenberg's POST
+        allowed_methods=frozenset(["GET", "PUT", "POST"]),
+        respect_retry_after_header=True,
+    ),
+)
+# Used for metadata requested through the API, which should fail right away
+# instead of keeping the request waiting
+_NO_RETRY_SESSION = _make_session(0)
+
+# PDF formats Gotenberg produces for the OCR_OUTPUT_TYPE setting
+# Valid inputs: https://gotenberg.dev/docs/modules/pdf-engines#uno
+GOTENBERG_PDF_FORMATS = {
+    "pdfa": "PDF/A-2b",
+    "pdfa-2": "PDF/A-2b",
+    "pdfa-1": "PDF/A-1a",
+    "pdfa-3": "PDF/A-3b",
+}
+
+
+def parse_iso_date(value: str) -> datetime.datetime:
+    """
+    Parses the ISO 8601 dates Tika reports, trying the much faster
+    datetime.fromisoformat before dateutil
+    """
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return dateutil.parser.isoparse(value)
+
+
+def parse_rmeta(rmeta: list) -> dict:
+    """
+    Converts the JSON list returned by Tika's /rmeta endpoint into the
+    content and metadata dict returned by tika.parser.from_file
+    """
+    content = "".join(entry.get("X-TIKA:content") or "" for entry in rmeta)
+    metadata = {}
+    for entry in rmeta:
+        for key, value in entry.items():
+            if key == "X-TIKA:content":
+                continue
+            if key not in metadata:
+                metadata[key] = value
+            elif isinstance(metadata[key], list):
+                metadata[key] = metadata[key] + [value]
+            else:
+                metadata[key] = [metadata[key], value]
+    return {"content": content or None, "metadata": metadata}
+
+
+class MultipartFileBody:
+    """
+    A multipart/form-data request body with a single file part, which is read
+    from disk while the request is sent rather than loaded into memory first.
+    Every iteration starts over, so the body can be sent again on a retry.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path, filename, fields=None, field_name="files"):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.path = path
+        self.fields = fields or {}
+
+        self._head = (
+            b"".join(
+                (
+                    f"--{boundary}\r\n"
+                    f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                    f"{value}\r\n"
+                ).encode()
+                for name, value in self.fields.items()
+            )
+            + (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{field_name}"; '
+                f'filename="{filename}"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n"
+            ).encode()
+        )
+        self._tail = f"\r\n--{boundary}--\r\n".encode()
+
+    def __len__(self):
+        # lets requests send a Content-Length instead of a chunked body
+        return len(self._head) + os.path.getsize(self.path) + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        with open(self.path, "rb") as f:
+            yield from iter(partial(f.read, self.CHUNK_SIZE), b"")
+        yield self._tail
 
 
 class TikaDocumentParser(DocumentParser):
@@ -17,6 +140,33 @@ class TikaDocumentParser(DocumentParser):
 
     logging_name = "paperless.parsing.tika"
 
+    def _tika_parse(self, document_path: str, session: requests.Session) -> dict:
+        url = settings.TIKA_ENDPOINT + "/rmeta/text"
+        headers = {"Accept": "application/json"}
+        timeout = (5, settings.CELERY_TASK_TIME_LIMIT)
+
+        if settings.TIKA_LOCAL_FILE_ACCESS:
+            # Let Tika read the document from the file system itself instead
+            # of uploading it. The Tika server must be able to access the
+            # same path and have file URLs enabled.
+            headers["fileUrl"] = Path(document_path).resolve().as_uri()
+            response = session.put(url, headers=headers, timeout=timeout)
+        else:
+            # the file name helps Tika to detect the type of the document
+            file_name = quote(os.path.basename(document_path))
+            headers["Content-Disposition"] = f"attachment; filename={file_name}"
+            # the document is streamed from disk rather than read into memory
+            with open(document_path, "rb") as f:
+                response = session.put(
+                    url,
+                    data=f,
+                    headers=headers,
+                    timeout=timeout,
+                )
+
+        response.raise_for_status()
+        return parse_rmeta(response.json())
+
     def get_thumbnail(self, document_path, mime_type, file_name=None):
         if not self.archive_path:
             self.archive_path = self.convert_to_pdf(document_path, file_name)
@@ -28,14 +178,12 @@ class TikaDocumentParser(DocumentParser):
         )
 
     def extract_metadata(self, document_path, mime_type):
-        tika_server = settings.TIKA_ENDPOINT
-
         # tika does not support a PathLike, only strings
         # ensure this is a string
         document_path = str(document_path)
 
         try:
-            parsed = parser.from_file(document_path, tika_server)
+            parsed = self._tika_parse(document_path, _NO_RETRY_SESSION)
         except Exception as e:
             self.log(
                 "warning",
@@ -48,9 +196,9 @@ class TikaDocumentParser(DocumentParser):
                 "namespace": "",
                 "prefix": "",
                 "key": key,
-                "value": parsed["metadata"][key],
+                "value": value,
             }
-            for key in parsed["metadata"]
+            for key, value in parsed["metadata"].items()
         ]
 
     def parse(self, document_path: Path, mime_type, file_name=None):
@@ -61,8 +209,17 @@ class TikaDocumentParser(DocumentParser):
         # ensure this is a string
         document_path = str(document_path)
 
+        # Tika and Gotenberg work on the document independently, so run the
+        # text extraction and the PDF conversion at the same time
+        executor = ThreadPoolExecutor(max_workers=2)
+        tika_result = executor.submit(self._tika_parse, document_path, _SESSION)
+        pdf_result = executor.submit(self.convert_to_pdf, document_path, file_name)
+        # Only wait for the results below, so that a Tika error is raised
+        # without waiting for the conversion, which is of no use then.
+        executor.shutdown(wait=False)
+
         try:
-            parsed = parser.from_file(document_path, tika_server)
+            parsed = tika_result.result()
         except Exception as err:
             raise ParseError(
                 f"Could not parse {document_path} with tika server at "
@@ -72,14 +229,14 @@ class TikaDocumentParser(DocumentParser):
         self.text = parsed["content"].strip()
 
         try:
-            self.date = dateutil.parser.isoparse(parsed["metadata"]["Creation-Date"])
+            self.date = parse_iso_date(parsed["metadata"]["Creation-Date"])
         except Exception as e:
             self.log(
                 "warning",
                 f"Unable to extract date for document " f"{document_path}: {e}",
             )
 
-        self.archive_path = self.convert_to_pdf(document_path, file_name)
+        self.archive_path = pdf_result.result()
 
     def convert_to_pdf(self, document_path, file_name):
         pdf_path = os.path.join(self.tempdir, "convert.pdf")
@@ -87,35 +244,39 @@ class TikaDocumentParser(DocumentParser):
         url = gotenberg_server + "/forms/libreoffice/convert"
 
         self.log("info", f"Converting {document_path} to PDF as {pdf_path}")
-        with open(document_path, "rb") as document_handle:
-            files = {
-                "files": (
-                    "convert" + os.path.splitext(document_path)[-1],
-                    document_handle,
-                ),
-            }
-            headers = {}
-            data = {}
-
-            # Set the output format of the resulting PDF
-            # Valid inputs: https://gotenberg.dev/docs/modules/pdf-engines#uno
-            if settings.OCR_OUTPUT_TYPE in {"pdfa", "pdfa-2"}:
-                data["pdfFormat"] = "PDF/A-2b"
-            elif settings.OCR_OUTPUT_TYPE == "pdfa-1":
-                data["pdfFormat"] = "PDF/A-1a"
-            elif settings.OCR_OUTPUT_TYPE == "pdfa-3":
-                data["pdfFormat"] = "PDF/A-3b"
-
-            try:
-                response = requests.post(url, files=files, headers=headers, data=data)
+
+        data = {}
+
+        # Set the output format of the resulting PDF
+        pdf_format = GOTENBERG_PDF_FORMATS.get(settings.OCR_OUTPUT_TYPE)
+        if pdf_format:
+            data["pdfFormat"] = pdf_format
+
+        body = MultipartFileBody(
+            document_path,
+            "convert" + os.path.splitext(document_path)[-1],
+            data,
+        )
+        headers = {"Content-Type": body.content_type}
+
+        try:
+            response = _SESSION.post(
+                url,
+                data=body,
+                headers=headers,
+                timeout=(5, settings.CELERY_TASK_TIME_LIMIT),
+                stream=True,
+            )
+            # closing the response returns the connection to the pool
+            with response:
                 response.raise_for_status()  # ensure we notice bad responses
-            except Exception as err:
-                raise ParseError(
-                    f"Error while converting document to PDF: {err}",
-                ) from err
-
-        with open(pdf_path, "wb") as file:
-            file.write(response.content)
-            file.close()
+                # write the PDF as it arrives instead of holding it in memory
+                with open(pdf_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+        except Exception as err:
+            raise ParseError(
+                f"Error while converting document to PDF: {err}",
+            ) from err
 
         return pdf_path
@@ -1,15 +1,30 @@
 import datetime
+import email
+import io
+import json
 import os
+import threading
 from pathlib import Path
 from unittest import mock
 
 from django.test import override_settings
 from django.test import TestCase
 from documents.parsers import ParseError
+from paperless_tika.parsers import _NO_RETRY_SESSION
+from paperless_tika.parsers import _SESSION
+from paperless_tika.parsers import MultipartFileBody
+from paperless_tika.parsers import parse_iso_date
 from paperless_tika.parsers import TikaDocumentParser
 from requests import Response
 
 
+def make_tika_response(content, metadata):
+    response = Response()
+    response._content = json.dumps([{**metadata, "X-TIKA:content": content}]).encode()
+    response.status_code = 200
+    return response
+
+
 class TestTikaParser(TestCase):
     def setUp(self) -> None:
         self.parser = TikaDocumentParser(logging_group=None)
@@ -17,15 +32,15 @@ class TestTikaParser(TestCase):
     def tearDown(self) -> None:
         self.parser.cleanup()
 
-    @mock.patch("paperless_tika.parsers.parser.from_file")
-    @mock.patch("paperless_tika.parsers.requests.post")
-    def test_parse(self, post, from_file):
-        from_file.return_value = {
-            "content": "the content",
-            "metadata": {"Creation-Date": "2020-11-21"},
-        }
+    @mock.patch("paperless_tika.parsers._SESSION.put")
+    @mock.patch("paperless_tika.parsers._SESSION.post")
+    def test_parse(self, post, put):
+        put.return_value = make_tika_response(
+            "the content",
+            {"Creation-Date": "2020-11-21"},
+        )
         response = Response()
-        response._content = b"PDF document"
+        response.raw = io.BytesIO(b"PDF document")
         response.status_code = 200
         post.return_value = response
 
@@ -40,11 +55,88 @@ class TestTikaParser(TestCase):
 
         self.assertEqual(self.parser.date, datetime.datetime(2020, 11, 21))
 
-    @mock.patch("paperless_tika.parsers.parser.from_file")
-    def test_metadata(self, from_file):
-        from_file.return_value = {
-            "metadata": {"Creation-Date": "2020-11-21", "Some-key": "value"},
-        }
+    @mock.patch("paperless_tika.parsers._SESSION.put")
+    @mock.patch("paperless_tika.parsers._SESSION.post")
+    def test_parse_concurrent_requests(self, post, put):
+        """
+        GIVEN:
+            - A document to parse
+        WHEN:
+            - The document is parsed
+        THEN:
+            - The Tika and Gotenberg requests are in flight at the same time
+        """
+        both_started = threading.Barrier(2, timeout=5)
+
+        def tika(*args, **kwargs):
+            both_started.wait()
+            return make_tika_response(
+                "the content",
+                {"Creation-Date": "2020-11-21"},
+            )
+
+        def gotenberg(*args, **kwargs):
+            both_started.wait()
+            response = Response()
+            response.raw = io.BytesIO(b"PDF document")
+            response.status_code = 200
+            return response
+
+        put.side_effect = tika
+        post.side_effect = gotenberg
+
+        file = os.path.join(self.parser.tempdir, "input.odt")
+        Path(file).touch()
+        self.parser.parse(file, "application/vnd.oasis.opendocument.text")
+
+        self.assertEqual(self.parser.text, "the content")
+        with open(self.parser.archive_path, "rb") as f:
+            self.assertEqual(f.read(), b"PDF document")
+
+    @mock.patch("paperless_tika.parsers._SESSION.put")
+    @mock.patch("paperless_tika.parsers._SESSION.post")
+    def test_parse_tika_failure(self, post, put):
+        """
+        GIVEN:
+            - A document to parse
+        WHEN:
+            - The Tika server returns an error
+        THEN:
+            - Parse error is raised
+            - The error is raised without waiting for the PDF conversion
+        """
+        conversion_released = threading.Event()
+        conversion_finished = threading.Event()
+
+        def gotenberg(*args, **kwargs):
+            conversion_released.wait(timeout=5)
+            conversion_finished.set()
+            response = Response()
+            response.raw = io.BytesIO(b"PDF document")
+            response.status_code = 200
+            return response
+
+        put.side_effect = Exception("Tika is down")
+        post.side_effect = gotenberg
+
+        file = os.path.join(self.parser.tempdir, "input.odt")
+        Path(file).touch()
+
+        try:
+            with self.assertRaises(ParseError):
+                self.parser.parse(file, "application/vnd.oasis.opendocument.text")
+            self.assertFalse(conversion_finished.is_set())
+        finally:
+            # let the conversion finish while the request is still mocked
+            conversion_released.set()
+            conversion_finished.wait(timeout=5)
+
+    @mock.patch("paperless_tika.parsers._NO_RETRY_SESSION.put")
+    def test_metadata(self, put):
+        put.return_value = make_tika_response(
+            "",
+            {"Creation-Date": "2020-11-21", "Some-key": "value"},
+        )
 
         file = os.path.join(self.parser.tempdir, "input.odt")
         Path(file).touch()
@@ -57,9 +149,99 @@ class TestTikaParser(TestCase):
         self.assertTrue("Creation-Date" in [m["key"] for m in metadata])
         self.assertTrue("Some-key" in [m["key"] for m in metadata])
 
-    @mock.patch("paperless_tika.parsers.parser.from_file")
-    @mock.patch("paperless_tika.parsers.requests.post")
-    def test_convert_failure(self, post, from_file):
+    @mock.patch("paperless_tika.parsers._NO_RETRY_SESSION.put")
+    def test_metadata_streams_document(self, put):
+        """
+        GIVEN:
+            - A document
+        WHEN:
+            - Metadata is extracted from the document
+        THEN:
+            - The document is uploaded to Tika's rmeta endpoint
+            - The file is passed to the request rather than its content
+        """
+        sent = {}
+
+        def tika(url, data, headers, timeout):
+            sent["url"] = url
+            sent["headers"] = headers
+            sent["is_file"] = isinstance(data, io.BufferedReader)
+            sent["content"] = data.read()
+            return make_tika_response("", {"Some-key": "value"})
+
+        put.side_effect = tika
+
+        file = os.path.join(self.parser.tempdir, "input file.odt")
+        Path(file).write_bytes(b"document content")
+
+        metadata = self.parser.extract_metadata(
+            file,
+            "application/vnd.oasis.opendocument.text",
+        )
+
+        self.assertIn("Some-key", [m["key"] for m in metadata])
+        self.assertTrue(sent["url"].endswith("/rmeta/text"))
+        self.assertTrue(sent["is_file"])
+        self.assertEqual(sent["content"], b"document content")
+        self.assertEqual(
+            sent["headers"]["Content-Disposition"],
+            "attachment; filename=input%20file.odt",
+        )
+
+    @override_settings(TIKA_LOCAL_FILE_ACCESS=True)
+    @mock.patch("paperless_tika.parsers._NO_RETRY_SESSION.put")
+    def test_metadata_local_file_access(self, put):
+        """
+        GIVEN:
+            - Tika can access the local file system
+        WHEN:
+            - Metadata is extracted from a document
+        THEN:
+            - Only the file URL of the document is sent to Tika
+            - The response is converted like tika.parser.from_file does
+        """
+        response = Response()
+        response._content = json.dumps(
+            [
+                {"Creation-Date": "2020-11-21", "X-TIKA:content": "the content"},
+                {"Some-key": "value", "X-TIKA:content": " more"},
+            ],
+        ).encode()
+        response.status_code = 200
+        put.return_value = response
+
+        file = os.path.join(self.parser.tempdir, "input.odt")
+        Path(file).touch()
+
+        metadata = self.parser.extract_metadata(
+            file,
+            "application/vnd.oasis.opendocument.text",
+        )
+
+        put.assert_called_once()
+        _, kwargs = put.call_args
+        self.assertEqual(kwargs["headers"]["fileUrl"], Path(file).resolve().as_uri())
+        self.assertNotIn("data", kwargs)
+        self.assertCountEqual(
+            metadata,
+            [
+                {
+                    "namespace": "",
+                    "prefix": "",
+                    "key": "Creation-Date",
+                    "value": "2020-11-21",
+                },
+                {"namespace": "", "prefix": "", "key": "Some-key", "value": "value"},
+            ],
+        )
+        self.assertEqual(
+            self.parser._tika_parse(file, _NO_RETRY_SESSION)["content"],
+            "the content more",
+        )
+
+    @mock.patch("paperless_tika.parsers._SESSION.put")
+    @mock.patch("paperless_tika.parsers._SESSION.post")
+    def test_convert_failure(self, post, put):
         """
         GIVEN:
             - Document needs to be converted to PDF
@@ -68,12 +250,12 @@ class TestTikaParser(TestCase):
         THEN:
             - Parse error is raised
         """
-        from_file.return_value = {
-            "content": "the content",
-            "metadata": {"Creation-Date": "2020-11-21"},
-        }
+        put.return_value = make_tika_response(
+            "the content",
+            {"Creation-Date": "2020-11-21"},
+        )
         response = Response()
-        response._content = b"PDF document"
+        response.raw = io.BytesIO(b"PDF document")
         response.status_code = 500
         post.return_value = response
 
@@ -83,7 +265,7 @@ class TestTikaParser(TestCase):
         with self.assertRaises(ParseError):
             self.parser.convert_to_pdf(file, None)
 
-    @mock.patch("paperless_tika.parsers.requests.post")
+    @mock.patch("paperless_tika.parsers._SESSION.post")
     def test_request_pdf_a_format(self, post: mock.Mock):
         """
         GIVEN:
@@ -96,10 +278,13 @@ class TestTikaParser(TestCase):
         file = os.path.join(self.parser.tempdir, "input.odt")
         Path(file).touch()
 
-        response = Response()
-        response._content = b"PDF document"
-        response.status_code = 200
-        post.return_value = response
+        def make_response(*args, **kwargs):
+            response = Response()
+            response.raw = io.BytesIO(b"PDF document")
+            response.status_code = 200
+            return response
+
+        post.side_effect = make_response
 
         for setting, expected_key in [
             ("pdfa", "PDF/A-2b"),
@@ -113,6 +298,109 @@ class TestTikaParser(TestCase):
                 post.assert_called_once()
                 _, kwargs = post.call_args
 
-                self.assertEqual(kwargs["data"]["pdfFormat"], expected_key)
+                self.assertEqual(kwargs["data"].fields["pdfFormat"], expected_key)
 
                 post.reset_mock()
+
+    def test_multipart_file_body(self):
+        """
+        GIVEN:
+            - A document to upload with form fields
+        WHEN:
+            - The multipart body is iterated
+        THEN:
+            - The body contains the fields and the file content
+            - The length matches the encoded body
+            - The body can be iterated again, e.g. for a retry
+        """
+        file = os.path.join(self.parser.tempdir, "input.odt")
+        Path(file).write_bytes(b"document content")
+
+        body = MultipartFileBody(file, "convert.odt", {"pdfFormat": "PDF/A-2b"})
+        encoded = b"".join(body)
+
+        self.assertEqual(len(body), len(encoded))
+        self.assertEqual(b"".join(body), encoded)
+
+        message = email.message_from_bytes(
+            f"Content-Type: {body.content_type}\r\n\r\n".encode() + encoded,
+        )
+        field, upload = message.get_payload()
+        self.assertEqual(
+            field.get_param("name", header="content-disposition"),
+            "pdfFormat",
+        )
+        self.assertEqual(field.get_payload(), "PDF/A-2b")
+        self.assertEqual(upload.get_filename(), "convert.odt")
+        self.assertEqual(upload.get_payload(decode=True), b"document content")
+
+    def test_session_retries_overloaded_server(self):
+        """
+        GIVEN:
+            - The session used for Tika and Gotenberg requests
+        WHEN:
+            - A server responds that it is overloaded
+        THEN:
+            - The Tika PUT and the Gotenberg POST are retried
+            - Other errors are not retried
+        """
+        retry = _SESSION.get_adapter("http://localhost:9998").max_retries
+
+        for method in ["PUT", "POST"]:
+            for status in [429, 502, 503, 504]:
+                with self.subTest(method=method, status=status):
+                    self.assertTrue(retry.is_retry(method, status))
+            self.assertFalse(retry.is_retry(method, 500))
+        self.assertTrue(retry.respect_retry_after_header)
+
+    def test_metadata_session_does_not_retry(self):
+        """
+        GIVEN:
+            - The session used for metadata requested through the API
+        WHEN:
+            - The Tika server can't be reached or is overloaded
+        THEN:
+            - The request is not retried
+        """
+        retry = _NO_RETRY_SESSION.get_adapter("http://localhost:9998").max_retries
+
+        self.assertEqual(retry.total, 0)
+
+    def test_parse_iso_date(self):
+        """
+        GIVEN:
+            - Creation dates in the formats Tika reports
+        WHEN:
+            - The dates are parsed
+        THEN:
+            - The results match dateutil's isoparse
+        """
+        for value, expected in [
+            ("2020-11-21", datetime.datetime(2020, 11, 21)),
+            (
+                "2020-11-21T10:11:12Z",
+                datetime.datetime(
+                    2020,
+                    11,
+                    21,
+                    10,
+                    11,
+                    12,
+                    tzinfo=datetime.timezone.utc,
+                ),
+            ),
+            (
+                "20201121T101112Z",
+                datetime.datetime(
+                    2020,
+                    11,
+                    21,
+                    10,
+                    11,
+                    12,
+                    tzinfo=datetime.timezone.utc,
+                ),
+            ),
+        ]:
+            with self.subTest(value=value):
+                self.assertEqual(parse_iso_date(value), expected)